@@ -1,11 +1,19 @@
+import atexit
 import logging
 import os
-from flask import Flask, jsonify, request
+from flask import Flask, request
 from dotenv import load_dotenv
+
+load_dotenv()
+
 import MetaTrader5 as mt5
-from flasgger import Swagger
+from waitress import serve
+from werkzeug.exceptions import HTTPException, Unauthorized
 from werkzeug.middleware.proxy_fix import ProxyFix
-from swagger import swagger_config
+from swagger import DOCS_ENABLED, swagger_config
+from auth import get_cached_token_payload
+from lib import ensure_connected
+from serialization import OrjsonProvider, json_response
 
 # Import routes
 from routes.health import health_bp
@@ -17,34 +25,47 @@ from routes.history import history_bp
 from routes.error import error_bp
 from routes.account import account_bp
 
-load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Prefixes of public routes (health check, Swagger UI, favicon, etc.), matched in
+# a single str.startswith call. '/apidocs' also covers the '/apidocs/' root.
+_PUBLIC_PREFIXES = (
+    '/health',
+    '/apidocs',           # Swagger UI
+    '/flasgger_static/',  # Swagger assets
+    '/favicon.ico',
+    '/apispec_1.json',
+)
+
 app = Flask(__name__)
 app.config['PREFERRED_URL_SCHEME'] = 'https'
+app.json = OrjsonProvider(app)
+
+if DOCS_ENABLED:
+    from flasgger import Swagger
+    swagger = Swagger(app, config=swagger_config)
 
-swagger = Swagger(app, config=swagger_config)
 @app.before_request
 def require_token_globally():
-    # Allow these public routes (e.g. health check, Swagger UI, favicon, etc.)
-    public_paths = [
-        '/health',
-        '/apidocs',           # Swagger UI
-        '/apidocs/',          # Swagger root
-        '/flasgger_static/',            # Swagger assets
-        '/favicon.ico',
-        '/apispec_1.json'
-    ]
-
     # Skip check for allowed paths
-    if any(request.path.startswith(path) for path in public_paths):
+    if request.path.startswith(_PUBLIC_PREFIXES):
         return
 
-    auth_header = request.headers.get('Authorization', '')
-    token = os.getenv('MT5_API_TOKEN')
+    # Accept any casing of the scheme and stray whitespace around the token
+    scheme, _, token = request.headers.get('Authorization', '').strip().partition(' ')
 
-    if not auth_header.startswith('Bearer ') or auth_header.split(' ')[1] != token:
-        return jsonify({'error': 'Unauthorized'}), 401
+    if scheme.lower() != 'bearer' or not get_cached_token_payload(token.strip().encode()):
+        raise Unauthorized('Unauthorized')
+
+@app.errorhandler(HTTPException)
+def handle_http_exception(e):
+    # One error schema for every 4xx/5xx raised by Flask or a view
+    response = json_response({'error': e.description, 'code': e.code}, e.code)
+    # Keep headers the exception carries (Allow, WWW-Authenticate, Retry-After)
+    for name, value in e.get_headers(request.environ):
+        if name.lower() != 'content-type':
+            response.headers.add(name, value)
+    return response
 
 # Register blueprints
 app.register_blueprint(health_bp)
@@ -59,7 +80,18 @@ app.register_blueprint(account_bp)
 
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
+# Connect to the terminal at startup; endpoints reuse the connection and
+# reconnect through ensure_connected() if the terminal was not ready yet.
+ensure_connected()
+atexit.register(mt5.shutdown)
+
 if __name__ == '__main__':
-    if not mt5.initialize():
-        logger.error("Failed to initialize MT5.")
-    app.run(host='0.0.0.0', port=int(os.environ.get('MT5_API_PORT')))
\ No newline at end of file
+    # waitress rather than the Werkzeug dev server: it runs on the Windows Python
+    # under Wine (gunicorn needs fork/fcntl) and serves requests on a thread pool,
+    # so one request blocked on terminal IPC does not stall the others.
+    serve(
+        app,
+        host='0.0.0.0',
+        port=int(os.environ.get('MT5_API_PORT')),
+        threads=int(os.environ.get('MT5_API_THREADS', 8)),
+    )
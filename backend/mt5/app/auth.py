@@ -0,0 +1,34 @@
+import hashlib
+import hmac
+import os
+import threading
+
+from cachetools import TTLCache
+
+# Read once at import; an unset token rejects every protected request.
+_TOKEN = os.getenv('MT5_API_TOKEN', '').encode()
+
+# sha256(token) -> validation result. Repeated requests carrying the same bearer
+# token resolve to a dict hit until the entry expires.
+_auth_cache = TTLCache(maxsize=10_000, ttl=5)
+_auth_cache_lock = threading.Lock()
+
+
+def _validate_token(token: bytes) -> bool:
+    return bool(_TOKEN) and hmac.compare_digest(token, _TOKEN)
+
+
+def get_cached_token_payload(token: bytes):
+    """
+    Returns the validation result for a bearer token, served from a short-lived cache.
+    """
+    key = hashlib.sha256(token).digest()
+    with _auth_cache_lock:
+        payload = _auth_cache.get(key)
+
+    if payload is None:
+        payload = _validate_token(token)
+        with _auth_cache_lock:
+            _auth_cache[key] = payload
+
+    return payload
@@ -4,9 +4,41 @@ from typing import List, Dict
 import pandas as pd
 from constants import MT5Timeframe
 import logging
+import os
+import threading
 
 logger = logging.getLogger(__name__)
 
+_connect_lock = threading.Lock()
+
+# How many order_send calls may be in flight at the terminal pipe at once,
+# across every endpoint and worker thread.
+ORDER_CONCURRENCY = max(1, int(os.getenv('MT5_ORDER_CONCURRENCY', 8)))
+_order_slots = threading.BoundedSemaphore(ORDER_CONCURRENCY)
+
+def order_send(request):
+    """
+    mt5.order_send bounded by MT5_ORDER_CONCURRENCY. All order sends go through here.
+    """
+    with _order_slots:
+        return mt5.order_send(request)
+
+def ensure_connected() -> bool:
+    """
+    Returns True when the MT5 terminal is connected, calling initialize() only
+    when it is not (e.g. the terminal was not ready at startup or restarted).
+    """
+    if mt5.terminal_info() is not None:
+        return True
+    with _connect_lock:
+        if mt5.terminal_info() is not None:
+            return True
+        if mt5.initialize():
+            logger.info("Connected to the MT5 terminal.")
+            return True
+    logger.error("Failed to initialize MT5: %s", mt5.last_error())
+    return False
+
 def get_timeframe(timeframe_str: str) -> MT5Timeframe:
     try:
         return MT5Timeframe[timeframe_str.upper()].value
@@ -61,7 +93,7 @@ def close_position(position, deviation=20, magic=0, comment='', type_filling=mt5
         "type_filling": type_filling,
     }
 
-    order_result = mt5.order_send(request)
+    order_result = order_send(request)
 
     if order_result.retcode != mt5.TRADE_RETCODE_DONE:
         logger.error(f"Failed to close position {position['ticket']}: {order_result.comment}")
@@ -115,9 +147,7 @@ def close_all_positions(order_type='all', magic=None, type_filling=mt5.ORDER_FIL
         return []
 
 def get_positions(magic=None):
-    # First check if MT5 is initialized
-    if not mt5.initialize():
-        logger.error("Failed to initialize MT5.")
+    if not ensure_connected():
         return pd.DataFrame()
 
     total_positions = mt5.positions_total()
@@ -1,17 +1,46 @@
-from flask import Blueprint, jsonify
-import MetaTrader5 as mt5
+from flask import Blueprint, Response, request
+from werkzeug.exceptions import BadRequest, HTTPException
+from MetaTrader5 import account_info as _account_info, last_error as _last_error
 import logging
-from flasgger import swag_from
+import os
+import threading
+import time
+from typing import Any, Optional
+from swagger import swag_from
+from serialization import dumps, json_response, parse_fields
 
 # Create a new blueprint for account-related endpoints
 account_bp = Blueprint('account', __name__)
 logger = logging.getLogger(__name__)
 
+# Dashboards poll account info far more often than it changes, so the serialized
+# body is reused for MT5_ACCOUNT_CACHE_MS milliseconds. 0 disables the cache.
+ACCOUNT_CACHE_TTL = float(os.getenv('MT5_ACCOUNT_CACHE_MS', 250)) / 1000
+
+# (fetched_at, account_info, encoded body)
+_acct_cache: Optional[tuple[float, Any, bytes]] = None
+_acct_cache_lock = threading.Lock()
+
+def _cached_account(now):
+    cached = _acct_cache
+    if cached is not None and now - cached[0] < ACCOUNT_CACHE_TTL:
+        return cached
+    return None
+
 @account_bp.route('/account_info', methods=['GET'])
 @swag_from({
     'tags': ['Account'],
     'summary': 'Get Account Information',
     'description': 'Retrieves detailed information about the connected MetaTrader 5 trading account.',
+    'parameters': [
+        {
+            'name': 'fields',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'Comma-separated list of fields to return (e.g. `balance,equity,margin_free`). All fields are returned when omitted.'
+        }
+    ],
     'responses': {
         200: {
             'description': 'Account information retrieved successfully.',
@@ -47,6 +76,9 @@ logger = logging.getLogger(__name__)
                 }
             }
         },
+        400: {
+            'description': 'Unknown field requested.'
+        },
         404: {
             'description': 'Failed to retrieve account information.'
         },
@@ -60,25 +92,45 @@ def get_account_info_endpoint():
     """
     Retrieves and returns the MT5 account information.
     """
+    global _acct_cache
     try:
-        # Request account info from MetaTrader 5
-        account_info = mt5.account_info()
-        
-        if account_info is None:
-            error_code, error_str = mt5.last_error()
-            logger.error(f"Failed to get account info. Last error: code {error_code}, message: {error_str}")
-            return jsonify({
-                "error": "Failed to get account info from MT5.",
-                "mt5_error_code": error_code,
-                "mt5_error_message": error_str
-            }), 404
+        fields = parse_fields(request.args.get('fields'))
+
+        cached = _cached_account(time.monotonic())
+        if cached is None:
+            # Concurrent pollers wait for a single refresh instead of all hitting MT5
+            with _acct_cache_lock:
+                now = time.monotonic()
+                cached = _cached_account(now)
+                if cached is None:
+                    # Request account info from MetaTrader 5
+                    account_info = _account_info()
+
+                    if account_info is None:
+                        error_code, error_str = _last_error()
+                        logger.error("Failed to get account info. Last error: code %s, message: %s", error_code, error_str)
+                        return json_response({
+                            "error": "Failed to get account info from MT5.",
+                            "mt5_error_code": error_code,
+                            "mt5_error_message": error_str
+                        }, 404)
+
+                    # Convert the named tuple to a dictionary for JSON serialization
+                    cached = _acct_cache = (now, account_info, dumps(account_info._asdict()))
+                    logger.info("Successfully retrieved account info for login %s.", account_info.login)
+
+        _, account_info, body = cached
+        if fields is None:
+            return Response(body, mimetype='application/json')
 
-        # Convert the named tuple to a dictionary for JSON serialization
-        account_info_dict = account_info._asdict()
-        
-        logger.info(f"Successfully retrieved account info for login {account_info.login}.")
-        return jsonify(account_info_dict)
+        # Pick only the requested attributes instead of serializing every field
+        unknown = [field for field in fields if field not in account_info._fields]
+        if unknown:
+            raise BadRequest(f"Unknown fields: {', '.join(unknown)}")
+        return json_response({field: getattr(account_info, field) for field in fields})
 
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"An exception occurred in get_account_info_endpoint: {str(e)}", exc_info=True)
-        return jsonify({"error": "Internal server error"}), 500
+        logger.error("An exception occurred in get_account_info_endpoint: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+        return json_response({"error": "Internal server error"}, 500)
@@ -4,7 +4,7 @@ import logging
 from datetime import datetime
 import pytz
 import pandas as pd
-from flasgger import swag_from
+from swagger import swag_from
 from lib import get_timeframe
 
 data_bp = Blueprint('data', __name__)
@@ -1,7 +1,7 @@
 from flask import Blueprint, jsonify
 import logging
 import MetaTrader5 as mt5
-from flasgger import swag_from
+from swagger import swag_from
 
 error_bp = Blueprint('error', __name__)
 logger = logging.getLogger(__name__)
@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify
 import MetaTrader5 as mt5
-from flasgger import swag_from
+from swagger import swag_from
+from lib import ensure_connected
 
 health_bp = Blueprint('health', __name__)
 
@@ -30,7 +31,7 @@ def health_check():
       200:
         description: Health check successful
     """
-    initialized = mt5.initialize() if mt5 is not None else False
+    initialized = ensure_connected() if mt5 is not None else False
     return jsonify({
         "status": "healthy",
         "mt5_connected": mt5 is not None,
@@ -2,7 +2,7 @@ from flask import Blueprint, jsonify, request
 import MetaTrader5 as mt5
 import logging
 from datetime import datetime
-from flasgger import swag_from
+from swagger import swag_from
 from lib import get_deal_from_ticket, get_order_from_ticket
 
 history_bp = Blueprint('history', __name__)
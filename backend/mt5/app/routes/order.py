@@ -1,7 +1,18 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, request
+from werkzeug.exceptions import BadRequest, HTTPException, RequestEntityTooLarge
 import MetaTrader5 as mt5
+from MetaTrader5 import (
+    symbol_info_tick as _symbol_info_tick, last_error as _last_error,
+    ORDER_FILLING_IOC as _IOC, TRADE_RETCODE_DONE as _DONE,
+)
 import logging
-from flasgger import swag_from
+import os
+import threading
+import time
+from typing import Any
+from swagger import swag_from
+from lib import order_send as _order_send
+from serialization import json_response, parse_fields
 
 order_bp = Blueprint('order', __name__)
 logger = logging.getLogger(__name__)
@@ -24,6 +35,201 @@ FILLING_TYPE_MAPPING = {
     "ORDER_FILLING_RETURN": mt5.ORDER_FILLING_RETURN,
 }
 
+# Fields of the OrderSendResult returned by order_send, selectable via `fields`
+_RESULT_FIELDS = frozenset({
+    'retcode', 'deal', 'order', 'volume', 'price', 'bid', 'ask',
+    'comment', 'request_id', 'retcode_external', 'request',
+})
+
+# Upper bound on orders per /orders/batch request, matching the position batches
+MAX_BATCH = 500
+
+# Ticks are cached per symbol for a few milliseconds so a burst of market orders
+# on the same symbol shares one terminal round-trip. MT5_TICK_CACHE_MS=0 disables it.
+TICK_CACHE_TTL = float(os.getenv('MT5_TICK_CACHE_MS', 10)) / 1000
+
+_tick_cache: dict[str, tuple[float, Any]] = {}
+_tick_cache_lock = threading.Lock()
+
+def _tick(symbol, ttl=TICK_CACHE_TTL):
+    if ttl <= 0:
+        return _symbol_info_tick(symbol)
+
+    now = time.monotonic()
+    with _tick_cache_lock:
+        hit = _tick_cache.get(symbol)
+    if hit and now - hit[0] < ttl:
+        return hit[1]
+
+    tick = _symbol_info_tick(symbol)
+    if tick is not None:
+        with _tick_cache_lock:
+            _tick_cache[symbol] = (now, tick)
+    return tick
+
+_ORDER_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'symbol': {'type': 'string', 'description': 'The financial instrument to trade.'},
+        'volume': {'type': 'number', 'description': 'The volume of the order.'},
+        'type': {
+            'type': 'string',
+            'description': 'The type of the order.',
+            'enum': list(ORDER_TYPE_MAPPING.keys())
+        },
+        'price': {'type': 'number', 'description': 'Required for all pending orders.'},
+        'stoplimit': {'type': 'number', 'description': 'Required for BUY_STOP_LIMIT and SELL_STOP_LIMIT orders.'},
+        'sl': {'type': 'number', 'description': 'Stop Loss price.'},
+        'tp': {'type': 'number', 'description': 'Take Profit price.'},
+        'deviation': {'type': 'integer', 'default': 20, 'description': 'Price deviation for market orders.'},
+        'magic': {'type': 'integer', 'default': 0, 'description': 'Magic number for the order.'},
+        'comment': {'type': 'string', 'default': '', 'description': 'Order comment.'},
+        'type_filling': {
+            'type': 'string',
+            'description': 'Order filling type.',
+            'enum': list(FILLING_TYPE_MAPPING.keys()),
+            'default': 'ORDER_FILLING_IOC'
+        }
+    },
+    'required': ['symbol', 'volume', 'type']
+}
+
+# Constant part of each request; builders copy a template and fill in the rest.
+_MARKET_TEMPLATE = {
+    "action": mt5.TRADE_ACTION_DEAL,
+    "type_time": mt5.ORDER_TIME_GTC, # Good Till Canceled
+    "deviation": 20,
+    "magic": 0,
+    "comment": "",
+}
+_PENDING_TEMPLATE = {**_MARKET_TEMPLATE, "action": mt5.TRADE_ACTION_PENDING}
+
+def _float(data, key):
+    # Bad client numbers are a 400, not a 500 from the catch-all
+    try:
+        return float(data[key])
+    except (TypeError, ValueError):
+        raise BadRequest(f"'{key}' must be a number")
+
+def _base_request(data, order_type_mt5, template):
+    request_data = template.copy()
+    request_data["symbol"] = data['symbol']
+    request_data["volume"] = _float(data, 'volume')
+    request_data["type"] = order_type_mt5
+    request_data["type_filling"] = FILLING_TYPE_MAPPING.get(data.get('type_filling'), _IOC)
+
+    # Client-supplied values override the template defaults
+    for key in ('deviation', 'magic', 'comment'):
+        if key in data:
+            request_data[key] = data[key]
+
+    # --- Add optional SL/TP if provided ---
+    if data.get('sl') is not None:
+        request_data["sl"] = _float(data, 'sl')
+    if data.get('tp') is not None:
+        request_data["tp"] = _float(data, 'tp')
+
+    return request_data
+
+# Each builder returns the MT5 request for one family of order types, raising
+# BadRequest when the payload is incomplete.
+
+def _build_market_buy(data, order_type_mt5, tick_fn):
+    # Parse the payload first so a malformed order never costs a tick lookup
+    request_data = _base_request(data, order_type_mt5, _MARKET_TEMPLATE)
+    tick = tick_fn(request_data["symbol"])
+    if tick is None:
+        raise BadRequest("Failed to get symbol price")
+    request_data["price"] = tick.ask
+    return request_data
+
+def _build_market_sell(data, order_type_mt5, tick_fn):
+    request_data = _base_request(data, order_type_mt5, _MARKET_TEMPLATE)
+    tick = tick_fn(request_data["symbol"])
+    if tick is None:
+        raise BadRequest("Failed to get symbol price")
+    request_data["price"] = tick.bid
+    return request_data
+
+def _build_pending(data, order_type_mt5, tick_fn):
+    if data.get('price') is None:
+        raise BadRequest("The 'price' field is required for pending orders")
+    request_data = _base_request(data, order_type_mt5, _PENDING_TEMPLATE)
+    request_data["price"] = _float(data, 'price')
+    return request_data
+
+def _build_stop_limit(data, order_type_mt5, tick_fn):
+    request_data = _build_pending(data, order_type_mt5, tick_fn)
+    if data.get('stoplimit') is None:
+        raise BadRequest("The 'stoplimit' field is required for STOP_LIMIT orders")
+    request_data["price_stoplimit"] = _float(data, 'stoplimit')
+    return request_data
+
+_BUILDERS = {
+    mt5.ORDER_TYPE_BUY: _build_market_buy,
+    mt5.ORDER_TYPE_SELL: _build_market_sell,
+    mt5.ORDER_TYPE_BUY_LIMIT: _build_pending,
+    mt5.ORDER_TYPE_SELL_LIMIT: _build_pending,
+    mt5.ORDER_TYPE_BUY_STOP: _build_pending,
+    mt5.ORDER_TYPE_SELL_STOP: _build_pending,
+    mt5.ORDER_TYPE_BUY_STOP_LIMIT: _build_stop_limit,
+    mt5.ORDER_TYPE_SELL_STOP_LIMIT: _build_stop_limit,
+}
+
+def _unknown_result_fields(fields):
+    return [field for field in fields or () if field not in _RESULT_FIELDS]
+
+def _send_order(data, tick_fn=_tick, fields=None):
+    """
+    Validates a single order payload and sends it to MT5. Returns (body, status);
+    invalid payloads raise BadRequest.
+    """
+    if not data:
+        raise BadRequest("Request body is required")
+    if not isinstance(data, dict):
+        raise BadRequest("Order must be a JSON object")
+
+    # --- Validate required fields ---
+    if 'symbol' not in data or 'volume' not in data or 'type' not in data:
+        raise BadRequest("Missing required fields: symbol, volume, type")
+
+    order_type = data['type']
+    if not isinstance(order_type, str):
+        raise BadRequest("The 'type' field must be a string")
+    order_type_mt5 = ORDER_TYPE_MAPPING.get(order_type)
+    builder = _BUILDERS.get(order_type_mt5)
+    if builder is None:
+        raise BadRequest(f"Invalid order type: {order_type}")
+
+    # --- Build the request for this order type ---
+    request_data = builder(data, order_type_mt5, tick_fn)
+
+    # --- Send the order to MetaTrader 5 ---
+    result = _order_send(request_data)
+    
+    if result is None:
+        error_code, error_str = _last_error()
+        logger.error("Order send failed. Last error: code %s, message: %s", error_code, error_str)
+        return {
+            "error": "Order send failed. MT5 returned no result.",
+            "mt5_error_code": error_code,
+            "mt5_error_message": error_str
+        }, 400
+
+    if result.retcode != _DONE:
+        result_dict = result._asdict()
+        logger.warning("Order not successful: %s. Result: %s", result.comment, result_dict)
+        return {
+            "error": f"Order failed: {result.comment}",
+            "result": result_dict
+        }, 400
+
+    logger.info("Order executed successfully: %s", result)
+    return {
+        "message": "Order executed successfully",
+        "result": result._asdict() if fields is None else {field: getattr(result, field) for field in fields}
+    }, 200
+
 @order_bp.route('/order', methods=['POST'])
 @swag_from({
     'tags': ['Order'],
@@ -34,32 +240,14 @@ FILLING_TYPE_MAPPING = {
             'name': 'body',
             'in': 'body',
             'required': True,
-            'schema': {
-                'type': 'object',
-                'properties': {
-                    'symbol': {'type': 'string', 'description': 'The financial instrument to trade.'},
-                    'volume': {'type': 'number', 'description': 'The volume of the order.'},
-                    'type': {
-                        'type': 'string',
-                        'description': 'The type of the order.',
-                        'enum': list(ORDER_TYPE_MAPPING.keys())
-                    },
-                    'price': {'type': 'number', 'description': 'Required for all pending orders.'},
-                    'stoplimit': {'type': 'number', 'description': 'Required for BUY_STOP_LIMIT and SELL_STOP_LIMIT orders.'},
-                    'sl': {'type': 'number', 'description': 'Stop Loss price.'},
-                    'tp': {'type': 'number', 'description': 'Take Profit price.'},
-                    'deviation': {'type': 'integer', 'default': 20, 'description': 'Price deviation for market orders.'},
-                    'magic': {'type': 'integer', 'default': 0, 'description': 'Magic number for the order.'},
-                    'comment': {'type': 'string', 'default': '', 'description': 'Order comment.'},
-                    'type_filling': {
-                        'type': 'string',
-                        'description': 'Order filling type.',
-                        'enum': list(FILLING_TYPE_MAPPING.keys()),
-                        'default': 'ORDER_FILLING_IOC'
-                    }
-                },
-                'required': ['symbol', 'volume', 'type']
-            }
+            'schema': _ORDER_SCHEMA
+        },
+        {
+            'name': 'fields',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'Comma-separated list of result fields to return on success (e.g. `retcode,order,price`). All fields are returned when omitted.'
         }
     ],
     'responses': {
@@ -86,85 +274,111 @@ def send_order_endpoint():
     Handles sending all types of MT5 orders.
     """
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "Request body is required"}), 400
-
-        # --- Validate required fields ---
-        required_fields = ['symbol', 'volume', 'type']
-        if not all(field in data for field in required_fields):
-            return jsonify({"error": "Missing required fields: symbol, volume, type"}), 400
-
-        order_type_mt5 = data.get('type')
-        if order_type_mt5 is None:
-            return jsonify({"error": f"Invalid order type: {order_type_mt5}"}), 400
-
-        # --- Prepare the base order request ---
-        request_data = {
-            "symbol": data['symbol'],
-            "volume": float(data['volume']),
-            "type": order_type_mt5,
-            "deviation": data.get('deviation', 20),
-            "magic": data.get('magic', 0),
-            "comment": data.get('comment', ''),
-            "type_time": mt5.ORDER_TIME_GTC, # Good Till Canceled
-            "type_filling": FILLING_TYPE_MAPPING.get(data.get('type_filling'), mt5.ORDER_FILLING_IOC),
+        fields = parse_fields(request.args.get('fields'))
+        unknown = _unknown_result_fields(fields)
+        if unknown:
+            raise BadRequest(f"Unknown fields: {', '.join(unknown)}")
+
+        data = request.get_json(silent=True, cache=False)
+        body, status = _send_order(data, fields=fields)
+        return json_response(body, status)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("An exception occurred in send_order_endpoint: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+        return json_response({"error": "Internal server error"}, 500)
+
+@order_bp.route('/orders/batch', methods=['POST'])
+@swag_from({
+    'tags': ['Order'],
+    'summary': 'Send Multiple Orders (Batch)',
+    'description': 'Sends a list of orders in a single request. Orders are sent one after another; market orders on the same symbol within MT5_TICK_CACHE_MS share one price lookup. At most 500 orders per batch. Each entry in `results` carries its own `status` code.',
+    'parameters': [
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': True,
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'orders': {
+                        'type': 'array',
+                        'items': _ORDER_SCHEMA,
+                        'description': 'Orders to send, in the same format as the /order endpoint.'
+                    }
+                },
+                'required': ['orders']
+            }
+        },
+        {
+            'name': 'fields',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'Comma-separated list of result fields to return on success (e.g. `retcode,order,price`). All fields are returned when omitted.'
         }
+    ],
+    'responses': {
+        200: {
+            'description': 'Batch order operation completed. Check each entry in `results`.',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'message': {'type': 'string'},
+                    'results': {
+                        'type': 'array',
+                        'items': {'type': 'object'}
+                    }
+                }
+            }
+        },
+        400: {
+            'description': 'Bad request, for example, missing the list of orders.'
+        },
+        413: {
+            'description': 'Too many orders in one batch.'
+        },
+        500: {
+            'description': 'Internal server error.'
+        }
+    }
+})
+def send_orders_batch_endpoint():
+    """
+    Sends multiple orders in a single batch request.
+    """
+    try:
+        data = request.get_json(silent=True, cache=False)
+        if not isinstance(data, dict) or not isinstance(data.get('orders'), list):
+            raise BadRequest("A JSON array of 'orders' is required.")
+        if len(data['orders']) > MAX_BATCH:
+            raise RequestEntityTooLarge(f"At most {MAX_BATCH} orders can be sent per batch.")
 
-        # --- Set action and price based on order type ---
-        is_market_order = order_type_mt5 in [mt5.ORDER_TYPE_BUY, mt5.ORDER_TYPE_SELL]
-        is_stop_limit_order = order_type_mt5 in [mt5.ORDER_TYPE_BUY_STOP_LIMIT, mt5.ORDER_TYPE_SELL_STOP_LIMIT]
-
-        if is_market_order:
-            request_data["action"] = mt5.TRADE_ACTION_DEAL
-            tick = mt5.symbol_info_tick(data['symbol'])
-            if tick is None:
-                return jsonify({"error": "Failed to get symbol price"}), 400
-            request_data["price"] = tick.ask if order_type_mt5 == mt5.ORDER_TYPE_BUY else tick.bid
-        else: # Pending order
-            request_data["action"] = mt5.TRADE_ACTION_PENDING
-            if 'price' not in data:
-                return jsonify({"error": "The 'price' field is required for pending orders"}), 400
-            request_data["price"] = float(data['price'])
-            
-            if is_stop_limit_order:
-                if 'stoplimit' not in data:
-                    return jsonify({"error": "The 'stoplimit' field is required for STOP_LIMIT orders"}), 400
-                request_data["price_stoplimit"] = float(data['stoplimit'])
-
-
-        # --- Add optional SL/TP if provided ---
-        if 'sl' in data and data['sl'] is not None:
-            request_data["sl"] = float(data['sl'])
-        if 'tp' in data and data['tp'] is not None:
-            request_data["tp"] = float(data['tp'])
-
-        # --- Send the order to MetaTrader 5 ---
-        result = mt5.order_send(request_data)
-        
-        if result is None:
-            error_code, error_str = mt5.last_error()
-            logger.error(f"Order send failed. Last error: code {error_code}, message: {error_str}")
-            return jsonify({
-                "error": "Order send failed. MT5 returned no result.",
-                "mt5_error_code": error_code,
-                "mt5_error_message": error_str
-            }), 400
+        fields = parse_fields(request.args.get('fields'))
+        unknown = _unknown_result_fields(fields)
+        if unknown:
+            raise BadRequest(f"Unknown fields: {', '.join(unknown)}")
 
-        result_dict = result._asdict()
-        if result.retcode != mt5.TRADE_RETCODE_DONE:
-            logger.warning(f"Order not successful: {result.comment}. Result: {result_dict}")
-            return jsonify({
-                "error": f"Order failed: {result.comment}",
-                "result": result_dict
-            }), 400
-
-        logger.info(f"Order executed successfully: {result_dict}")
-        return jsonify({
-            "message": "Order executed successfully",
-            "result": result_dict
+        results = []
+        for order in data['orders']:
+            try:
+                body, status = _send_order(order, fields=fields)
+            except HTTPException as e:
+                body, status = {"error": e.description}, e.code
+            except Exception as e:
+                logger.error("An exception occurred while sending a batch order: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+                body, status = {"error": "Internal server error"}, 500
+            body["status"] = status
+            results.append(body)
+
+        return json_response({
+            "message": "Batch order operation completed.",
+            "results": results
         })
 
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"An exception occurred in send_order_endpoint: {str(e)}", exc_info=True)
-        return jsonify({"error": "Internal server error"}), 500
+        logger.error("An exception occurred in send_orders_batch_endpoint: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+        return json_response({"error": "Internal server error"}, 500)
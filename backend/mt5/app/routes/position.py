@@ -1,13 +1,98 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 import MetaTrader5 as mt5
+from MetaTrader5 import (
+    symbol_info_tick as _symbol_info_tick,
+    ORDER_TYPE_SELL as _SELL, ORDER_TYPE_BUY as _BUY, POSITION_TYPE_BUY as _POS_BUY,
+    TRADE_ACTION_DEAL as _ACT_DEAL, TRADE_ACTION_SLTP as _ACT_SLTP, ORDER_TIME_GTC as _GTC,
+    ORDER_FILLING_IOC as _IOC, ORDER_FILLING_FOK as _FOK, TRADE_RETCODE_DONE as _DONE,
+)
+import ctypes
 import logging
-from lib import close_position, close_all_positions, get_positions
-from flasgger import swag_from
+import os
+from lib import (
+    ORDER_CONCURRENCY, close_position, close_all_positions, ensure_connected, get_positions,
+    order_send as _order_send,
+)
+from swagger import swag_from
+from serialization import dumps
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 position_bp = Blueprint('position', __name__)
 logger = logging.getLogger(__name__)
 
+# Upper bound on tickets per batch close, to keep the terminal's request queue bounded
+MAX_BATCH = 500
+
+# Constant fields of the close requests; workers copy these and fill in the
+# per-position fields.
+_CLOSE_ALL_TEMPLATE = {
+    "action": _ACT_DEAL,
+    "deviation": 10,
+    "comment": "Closed by API",
+    "type_time": _GTC,
+    "type_filling": _IOC,
+}
+_BATCH_CLOSE_TEMPLATE = {
+    "action": _ACT_DEAL,
+    "deviation": 20,
+    "magic": 0,
+    "comment": "Batch Close",
+    "type_time": _GTC,
+    "type_filling": _FOK,
+}
+_SLTP_TEMPLATE = {"action": _ACT_SLTP}
+
+def _parse_cpus(value):
+    """
+    Parses MT5_WORKER_CPUS into a set of core indices. An invalid value is logged
+    and ignored rather than breaking the worker pool.
+    """
+    try:
+        cpus = {int(cpu) for cpu in value.split(',') if cpu.strip()}
+    except ValueError:
+        logger.warning("Ignoring MT5_WORKER_CPUS=%r: not a comma-separated list of integers.", value)
+        return set()
+    cpu_count = os.cpu_count() or 1
+    if any(cpu < 0 or cpu >= cpu_count for cpu in cpus):
+        logger.warning("Ignoring MT5_WORKER_CPUS=%r: CPU indices must be between 0 and %d.", value, cpu_count - 1)
+        return set()
+    return cpus
+
+# Optional core set (e.g. "2,3") the pool workers are pinned to, keeping them
+# off the cores serving HTTP requests. Unset leaves scheduling to the OS.
+_WORKER_CPUS = _parse_cpus(os.getenv('MT5_WORKER_CPUS', ''))
+
+def _pin_worker():
+    """
+    Pool initializer pinning the calling worker thread to _WORKER_CPUS.
+    """
+    if not _WORKER_CPUS:
+        return
+    try:
+        if hasattr(os, 'sched_setaffinity'):
+            # On Linux pid 0 is the calling thread, not the whole process
+            os.sched_setaffinity(0, _WORKER_CPUS)
+        elif os.name == 'nt':
+            kernel32 = ctypes.windll.kernel32
+            kernel32.GetCurrentThread.restype = ctypes.c_void_p
+            kernel32.SetThreadAffinityMask.argtypes = (ctypes.c_void_p, ctypes.c_size_t)
+            kernel32.SetThreadAffinityMask.restype = ctypes.c_size_t
+            mask = sum(1 << cpu for cpu in _WORKER_CPUS)
+            if not kernel32.SetThreadAffinityMask(kernel32.GetCurrentThread(), mask):
+                raise ctypes.WinError()
+    except Exception as e:
+        # An initializer that raises breaks the whole pool, so pinning is best effort
+        logger.warning("Could not pin MT5 worker to CPUs %s: %s", sorted(_WORKER_CPUS), e)
+
+# Shared by the close and SL/TP batch endpoints so threads are created once, not per request.
+# Always enough workers to keep ORDER_CONCURRENCY sends queued at the terminal;
+# beyond that, more threads only add context switching.
+_CLOSE_POOL = ThreadPoolExecutor(
+    max_workers=min(32, max(ORDER_CONCURRENCY, (os.cpu_count() or 4) * 2)),
+    thread_name_prefix="mt5-close",
+    initializer=_pin_worker,
+)
+
 @position_bp.route('/close_position', methods=['POST'])
 @swag_from({
     'tags': ['Position'],
@@ -70,7 +155,7 @@ def close_position_endpoint():
     description: Close a specific trading position based on the provided position data.
     """
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True, cache=False)
         if not data or 'position' not in data:
             return jsonify({"error": "Position data is required"}), 400
         
@@ -81,9 +166,36 @@ def close_position_endpoint():
         return jsonify({"message": "Position closed successfully", "result": result._asdict()})
     
     except Exception as e:
-        logger.error(f"Error in close_position: {str(e)}")
+        logger.error("Error in close_position: %s", e)
         return jsonify({"error": "Internal server error"}), 500
 
+def _close_one_position(pos, tick_cache):
+    """
+    Closes one position for close_all_positions using the prefetched tick cache.
+    """
+    try:
+        order_type = _SELL if pos.type == _POS_BUY else _BUY
+        tick = tick_cache[pos.symbol]
+        if tick is None:
+            return {"status": "failed", "ticket": pos.ticket, "symbol": pos.symbol, "error": "Failed to get price"}
+        price = tick.bid if order_type == _SELL else tick.ask
+
+        order_request = _CLOSE_ALL_TEMPLATE.copy()
+        order_request["symbol"] = pos.symbol
+        order_request["volume"] = pos.volume
+        order_request["type"] = order_type
+        order_request["position"] = pos.ticket
+        order_request["price"] = price
+        order_request["magic"] = pos.magic
+
+        result = _order_send(order_request)
+        if result.retcode == _DONE:
+            return {"status": "closed", "ticket": pos.ticket}
+        else:
+            return {"status": "failed", "ticket": pos.ticket, "symbol": pos.symbol, "error": result.retcode}
+    except Exception as e:
+        return {"status": "failed", "ticket": pos.ticket, "error": str(e)}
+
 @position_bp.route('/close_all_positions', methods=['POST'])
 @swag_from({
     'tags': ['Position'],
@@ -118,6 +230,9 @@ def close_position_endpoint():
         },
         500: {
             'description': 'Internal server error.'
+        },
+        503: {
+            'description': 'MT5 terminal is not connected.'
         }
     }
 })
@@ -128,60 +243,35 @@ def close_all_positions_endpoint():
     description: Closes all open positions for the current account using multithreading, optionally filtered by magic number.
     """
     try:
-        if not mt5.initialize():
-            return jsonify({'error': f'MT5 initialize failed: {mt5.last_error()}'}), 500
+        if not ensure_connected():
+            return jsonify({'error': f'MT5 terminal is not connected: {mt5.last_error()}'}), 503
 
         positions = mt5.positions_get()
         if positions is None:
-            mt5.shutdown()
             return jsonify({'error': f'positions_get failed: {mt5.last_error()}'}), 500
+        if not positions:
+            return jsonify({"closed": [], "failed": []}), 200
 
         closed = []
         failed = []
 
-        def close_position(pos):
-            try:
-                order_type = mt5.ORDER_TYPE_SELL if pos.type == mt5.POSITION_TYPE_BUY else mt5.ORDER_TYPE_BUY
-                price = mt5.symbol_info_tick(pos.symbol).bid if order_type == mt5.ORDER_TYPE_SELL else mt5.symbol_info_tick(pos.symbol).ask
-
-                order_request = {
-                    "action": mt5.TRADE_ACTION_DEAL,
-                    "symbol": pos.symbol,
-                    "volume": pos.volume,
-                    "type": order_type,
-                    "position": pos.ticket,
-                    "price": price,
-                    "deviation": 10,
-                    "magic": pos.magic,
-                    "comment": "Closed by API",
-                    "type_time": mt5.ORDER_TIME_GTC,
-                    "type_filling": mt5.ORDER_FILLING_IOC
-                }
+        # One tick per symbol, shared by every position on it
+        tick_cache = {symbol: _symbol_info_tick(symbol) for symbol in {pos.symbol for pos in positions}}
+
+        # Run in parallel on the shared pool
+        futures = [_CLOSE_POOL.submit(_close_one_position, pos, tick_cache) for pos in positions]
+
+        for future in as_completed(futures):
+            result = future.result()
+            if result["status"] == "closed":
+                closed.append(result["ticket"])
+            else:
+                failed.append(result)
 
-                result = mt5.order_send(order_request)
-                if result.retcode == mt5.TRADE_RETCODE_DONE:
-                    return {"status": "closed", "ticket": pos.ticket}
-                else:
-                    return {"status": "failed", "ticket": pos.ticket, "symbol": pos.symbol, "error": result.retcode}
-            except Exception as e:
-                return {"status": "failed", "ticket": pos.ticket, "error": str(e)}
-
-        # Run all in parallel
-        with ThreadPoolExecutor(max_workers=len(positions)) as executor:
-            futures = [executor.submit(close_position, pos) for pos in positions]
-
-            for future in as_completed(futures):
-                result = future.result()
-                if result["status"] == "closed":
-                    closed.append(result["ticket"])
-                else:
-                    failed.append(result)
-
-        mt5.shutdown()
         return jsonify({"closed": closed, "failed": failed}), 200
 
     except Exception as e:
-        logger.error(f"Error in close_all_positions: {str(e)}")
+        logger.error("Error in close_all_positions: %s", e)
         return jsonify({"error": "Internal server error"}), 500
 @position_bp.route('/modify_sl_tp', methods=['POST'])
 @swag_from({
@@ -231,7 +321,7 @@ def modify_sl_tp_endpoint():
     Modify the Stop Loss (SL) and Take Profit (TP) levels for a specific position.
     """
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True, cache=False)
         if not data or 'position' not in data:
             return jsonify({"error": "The 'position' ticket number is required"}), 400
         
@@ -261,11 +351,11 @@ def modify_sl_tp_endpoint():
         }
         
         # --- Send the modification request ---
-        result = mt5.order_send(request_data)
+        result = _order_send(request_data)
         
         if result is None:
             error_code, error_str = mt5.last_error()
-            logger.error(f"Failed to modify SL/TP for position {position_ticket}. Last error: code {error_code}, message: {error_str}")
+            logger.error("Failed to modify SL/TP for position %s. Last error: code %s, message: %s", position_ticket, error_code, error_str)
             return jsonify({
                 "error": "Failed to modify SL/TP. MT5 returned no result.",
                 "mt5_error_code": error_code,
@@ -274,17 +364,155 @@ def modify_sl_tp_endpoint():
 
         result_dict = result._asdict()
         if result.retcode != mt5.TRADE_RETCODE_DONE:
-            logger.warning(f"Modification of SL/TP for position {position_ticket} not successful: {result.comment}. Result: {result_dict}")
+            logger.warning("Modification of SL/TP for position %s not successful: %s. Result: %s", position_ticket, result.comment, result_dict)
             return jsonify({
                 "error": f"Failed to modify SL/TP: {result.comment}",
                 "result": result_dict
             }), 400
         
-        logger.info(f"SL/TP for position {position_ticket} modified successfully. Result: {result_dict}")
+        logger.info("SL/TP for position %s modified successfully. Result: %s", position_ticket, result_dict)
         return jsonify({"message": "SL/TP modified successfully", "result": result_dict})
     
     except Exception as e:
-        logger.error(f"An exception occurred in modify_sl_tp_endpoint: {str(e)}", exc_info=True)
+        logger.error("An exception occurred in modify_sl_tp_endpoint: %s", e, exc_info=True)
+        return jsonify({"error": "Internal server error"}), 500
+
+def _modify_one(update, positions_map):
+    """
+    Applies one validated SL/TP update of a batch. Returns (succeeded, entry) where
+    entry is the per-position result reported to the client.
+    """
+    ticket = update['position']
+    try:
+        sl_price = float(update.get('sl', 0.0) or 0.0)
+        tp_price = float(update.get('tp', 0.0) or 0.0)
+
+        position_info = positions_map.get(ticket)
+        if position_info is None:
+            return False, {"position": ticket, "error": "Position not found."}
+
+        request_data = _SLTP_TEMPLATE.copy()
+        request_data["position"] = ticket
+        request_data["symbol"] = position_info.symbol
+        request_data["sl"] = sl_price
+        request_data["tp"] = tp_price
+
+        result = _order_send(request_data)
+        if result is None:
+            error_code, error_str = mt5.last_error()
+            logger.error("Failed to modify SL/TP for position %s. Last error: code %s, message: %s", ticket, error_code, error_str)
+            return False, {"position": ticket, "error": "MT5 returned no result.", "mt5_error_code": error_code, "mt5_error_message": error_str}
+
+        result_dict = result._asdict()
+        if result.retcode != _DONE:
+            logger.warning("Modification of SL/TP for position %s not successful: %s", ticket, result.comment)
+            return False, {"position": ticket, "error": result.comment, "result": result_dict}
+
+        return True, {"position": ticket, "result": result_dict}
+
+    except Exception as e:
+        logger.error("An exception occurred while modifying SL/TP for position %s in batch: %s", ticket, e)
+        return False, {"position": ticket, "error": str(e)}
+
+@position_bp.route('/modify_sl_tp_batch', methods=['POST'])
+@swag_from({
+    'tags': ['Position'],
+    'summary': 'Modify Stop Loss and Take Profit (Batch)',
+    'description': 'Modify the SL/TP levels of several open positions in one request, for example to trail stops across an account. Set sl or tp to 0.0 to remove it.',
+    'parameters': [
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': True,
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'updates': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'position': {'type': 'integer', 'description': 'The ticket number of the position to modify.'},
+                                'sl': {'type': 'number', 'description': 'The new Stop Loss price. Use 0 to remove.'},
+                                'tp': {'type': 'number', 'description': 'The new Take Profit price. Use 0 to remove.'}
+                            },
+                            'required': ['position']
+                        },
+                        'description': 'At most 500 updates per batch. When a position appears more than once, only its last update is applied.'
+                    }
+                },
+                'required': ['updates']
+            }
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Batch modification completed. Check the response body for per-position results.',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'succeeded': {
+                        'type': 'array',
+                        'items': {'type': 'object'}
+                    },
+                    'failed': {
+                        'type': 'array',
+                        'items': {'type': 'object'}
+                    }
+                }
+            }
+        },
+        400: {
+            'description': 'Bad request, for example, missing the list of updates.'
+        },
+        413: {
+            'description': 'Too many updates in one batch.'
+        },
+        500: {
+            'description': 'Internal server error.'
+        }
+    }
+})
+def modify_sl_tp_batch_endpoint():
+    """
+    Modifies the SL/TP levels of multiple positions in a single batch request.
+    """
+    try:
+        data = request.get_json(silent=True, cache=False)
+        if not isinstance(data, dict) or not isinstance(data.get('updates'), list):
+            return jsonify({"error": "A JSON array of 'updates' is required."}), 400
+
+        # Only exact ints are accepted: coercing 1.5 would modify another position
+        if any(not isinstance(update, dict) or type(update.get('position')) is not int for update in data['updates']):
+            return jsonify({"error": "Each update must be an object with an integer 'position' ticket number."}), 400
+        # Concurrent sends to one position would race, so the last update per position wins
+        updates = list({update['position']: update for update in data['updates']}.values())
+        if any(update['position'] <= 0 for update in updates):
+            return jsonify({"error": "Ticket numbers must be positive."}), 400
+        if len(updates) > MAX_BATCH:
+            return jsonify({"error": f"At most {MAX_BATCH} updates can be applied per batch."}), 413
+        if not updates:
+            return jsonify({"succeeded": [], "failed": []})
+
+        # One positions_get() for the whole batch instead of one lookup per update
+        positions_map = {pos.ticket: pos for pos in (mt5.positions_get() or ())}
+
+        succeeded = []
+        failed = []
+        futures = [_CLOSE_POOL.submit(_modify_one, update, positions_map) for update in updates]
+
+        for future in as_completed(futures):
+            ok, entry = future.result()
+            if ok:
+                succeeded.append(entry)
+            else:
+                failed.append(entry)
+
+        logger.info("SL/TP batch completed: %d succeeded, %d failed.", len(succeeded), len(failed))
+        return jsonify({"succeeded": succeeded, "failed": failed})
+
+    except Exception as e:
+        logger.error("An exception occurred in modify_sl_tp_batch_endpoint: %s", e, exc_info=True)
         return jsonify({"error": "Internal server error"}), 500
 
 @position_bp.route('/get_positions', methods=['GET'])
@@ -355,10 +583,11 @@ def get_positions_endpoint():
         if positions_df.empty:
             return jsonify({"positions": []}), 200
             
-        return jsonify(positions_df.to_dict(orient='records')), 200
+        # Encoded by pandas in C, without building a dict per row
+        return Response(positions_df.to_json(orient='records', double_precision=15), mimetype='application/json')
     
     except Exception as e:
-        logger.error(f"Error in get_positions: {str(e)}")
+        logger.error("Error in get_positions: %s", e)
         return jsonify({"error": "Internal server error"}), 500
 
 @position_bp.route('/positions_total', methods=['GET'])
@@ -396,13 +625,71 @@ def positions_total_endpoint():
         return jsonify({"total": total})
     
     except Exception as e:
-        logger.error(f"Error in positions_total: {str(e)}")
+        logger.error("Error in positions_total: %s", e)
         return jsonify({"error": "Internal server error"}), 500
     
 
 
 
 
+def _close_one(ticket, positions_map, ticks_map):
+    """
+    Closes one position of a batch. Returns (closed, entry) where entry is the
+    per-ticket result reported to the client.
+    """
+    try:
+        # --- Get position details ---
+        position_info = positions_map.get(ticket)
+        if position_info is None:
+            logger.warning("Attempted to close non-existent position with ticket: %s", ticket)
+            return False, {"ticket": ticket, "error": "Position not found."}
+
+        # --- Determine the correct closing order type ---
+        order_type = _SELL if position_info.type == _POS_BUY else _BUY
+
+        # --- Get the current price for closing ---
+        tick = ticks_map[position_info.symbol]
+        if tick is None:
+            logger.error("Could not retrieve tick for %s to close ticket %s", position_info.symbol, ticket)
+            return False, {"ticket": ticket, "error": f"Failed to get price for symbol {position_info.symbol}"}
+
+        price = tick.bid if order_type == _SELL else tick.ask
+
+        # --- Prepare the closing request ---
+        close_request = _BATCH_CLOSE_TEMPLATE.copy()
+        close_request["position"] = position_info.ticket
+        close_request["symbol"] = position_info.symbol
+        close_request["volume"] = position_info.volume
+        close_request["type"] = order_type
+        close_request["price"] = price
+
+        # --- Send the closing order ---
+        result = _order_send(close_request)
+        result_dict = result._asdict() if result else None
+
+        if result and result.retcode == _DONE:
+            logger.info("Successfully closed position %s in batch operation.", ticket)
+            return True, {"ticket": ticket, "result": result_dict}
+
+        error_message = result.comment if result else "order_send returned None"
+        logger.error("Failed to close position %s in batch. Reason: %s", ticket, error_message)
+        return False, {"ticket": ticket, "error": error_message, "result": result_dict}
+
+    except Exception as e:
+        logger.error("An exception occurred while closing position %s in batch: %s", ticket, e)
+        return False, {"ticket": ticket, "error": str(e)}
+
+def _stream_closes(futures):
+    """
+    Yields one NDJSON line per close as it completes.
+    """
+    closed_count = 0
+    for future in as_completed(futures):
+        closed, entry = future.result()
+        closed_count += closed
+        yield dumps({"status": "closed" if closed else "failed", **entry}) + b"\n"
+    logger.info("Batch close completed: %d closed, %d failed.", closed_count, len(futures) - closed_count)
+
 @position_bp.route('/close_positions_batch', methods=['POST'])
 @swag_from({
     'tags': ['Position'],
@@ -419,11 +706,24 @@ def positions_total_endpoint():
                     'tickets': {
                         'type': 'array',
                         'items': {'type': 'integer'},
-                        'description': 'A list of position ticket numbers to close.'
+                        'description': 'A list of integer position ticket numbers to close. Duplicates are ignored; at most 500 per batch.'
+                    },
+                    'group': {
+                        'type': 'string',
+                        'description': 'Optional MT5 symbol group filter (e.g. "EUR*,GBP*") applied by the terminal when fetching positions.'
                     }
                 },
                 'required': ['tickets']
             }
+        },
+        {
+            'name': 'stream',
+            'in': 'query',
+            'type': 'boolean',
+            'required': False,
+            'description': 'Stream one result per line as application/x-ndjson as each close completes, '
+                           'instead of a single JSON body. Each line carries the ticket, a "status" of '
+                           '"closed" or "failed", and the per-ticket result or error.'
         }
     ],
     'responses': {
@@ -445,7 +745,10 @@ def positions_total_endpoint():
             }
         },
         400: {
-            'description': 'Bad request, for example, missing the list of tickets.'
+            'description': 'Bad request, for example, missing the list of tickets or a malformed ticket.'
+        },
+        413: {
+            'description': 'Too many tickets in one batch.'
         },
         500: {
             'description': 'Internal server error.'
@@ -457,62 +760,56 @@ def close_positions_batch_endpoint():
     Closes multiple positions in a single batch request.
     """
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True, cache=False)
         if not data or 'tickets' not in data or not isinstance(data['tickets'], list):
             return jsonify({"error": "A JSON array of 'tickets' is required."}), 400
 
-        tickets_to_close = data['tickets']
+        # Validate and dedupe up front so malformed input never reaches the terminal.
+        # Only exact ints are accepted: coercing 2.9 or true would close another position.
+        if any(type(ticket) is not int for ticket in data['tickets']):
+            return jsonify({"error": "'tickets' must contain only integer ticket numbers."}), 400
+        tickets_to_close = set(data['tickets'])
+        if any(ticket <= 0 for ticket in tickets_to_close):
+            return jsonify({"error": "Ticket numbers must be positive."}), 400
+        if len(tickets_to_close) > MAX_BATCH:
+            return jsonify({"error": f"At most {MAX_BATCH} tickets can be closed per batch."}), 413
+        if not tickets_to_close:
+            return jsonify({
+                "message": "Batch close operation completed.",
+                "successful_closes": [],
+                "failed_closes": []
+            })
+
         successful_closes = []
         failed_closes = []
 
-        for ticket in tickets_to_close:
-            # --- Get position details ---
-            position_info_tuple = mt5.positions_get(ticket=ticket)
-            if not position_info_tuple:
-                failed_closes.append({"ticket": ticket, "error": "Position not found."})
-                logger.warning(f"Attempted to close non-existent position with ticket: {ticket}")
-                continue
-            
-            position_info = position_info_tuple[0]
-
-            # --- Determine the correct closing order type ---
-            order_type = mt5.ORDER_TYPE_SELL if position_info.type == mt5.ORDER_TYPE_BUY else mt5.ORDER_TYPE_BUY
-
-            # --- Get the current price for closing ---
-            tick = mt5.symbol_info_tick(position_info.symbol)
-            if tick is None:
-                failed_closes.append({"ticket": ticket, "error": f"Failed to get price for symbol {position_info.symbol}"})
-                logger.error(f"Could not retrieve tick for {position_info.symbol} to close ticket {ticket}")
-                continue
-
-            price = tick.bid if order_type == mt5.ORDER_TYPE_SELL else tick.ask
-
-            # --- Prepare the closing request ---
-            close_request = {
-                "action": mt5.TRADE_ACTION_DEAL,
-                "position": position_info.ticket,
-                "symbol": position_info.symbol,
-                "volume": position_info.volume,
-                "type": order_type,
-                "price": price,
-                "deviation": 20,
-                "magic": 0,
-                "comment": "Batch Close",
-                "type_time": mt5.ORDER_TIME_GTC,
-                "type_filling": mt5.ORDER_FILLING_FOK,
-            }
-
-            # --- Send the closing order ---
-            result = mt5.order_send(close_request)
-            
-            if result and result.retcode == mt5.TRADE_RETCODE_DONE:
-                successful_closes.append({"ticket": ticket, "result": result._asdict()})
-                logger.info(f"Successfully closed position {ticket} in batch operation.")
+        group = data.get('group')
+        if group is not None and not isinstance(group, str):
+            return jsonify({"error": "'group' must be a string."}), 400
+
+        # --- Fetch all positions and the ticks they need in one pass ---
+        # One positions_get() and one tick per symbol instead of two IPC calls per ticket.
+        # A group filter is applied by the terminal, so only matching positions cross the pipe.
+        positions = mt5.positions_get(group=group) if group else mt5.positions_get()
+        positions_map = {pos.ticket: pos for pos in (positions or ())}
+        symbols = {positions_map[ticket].symbol for ticket in tickets_to_close if ticket in positions_map}
+        ticks_map = {symbol: _symbol_info_tick(symbol) for symbol in symbols}
+
+        # Each order_send blocks on terminal IPC, so closing in parallel turns the
+        # total latency from the sum of round trips into roughly the slowest one.
+        futures = [_CLOSE_POOL.submit(_close_one, ticket, positions_map, ticks_map) for ticket in tickets_to_close]
+
+        if request.args.get('stream', 'false').lower() in ('1', 'true'):
+            return Response(stream_with_context(_stream_closes(futures)), mimetype='application/x-ndjson')
+
+        for future in as_completed(futures):
+            closed, entry = future.result()
+            if closed:
+                successful_closes.append(entry)
             else:
-                error_message = result.comment if result else "order_send returned None"
-                failed_closes.append({"ticket": ticket, "error": error_message, "result": result._asdict() if result else None})
-                logger.error(f"Failed to close position {ticket} in batch. Reason: {error_message}")
+                failed_closes.append(entry)
 
+        logger.info("Batch close completed: %d closed, %d failed.", len(successful_closes), len(failed_closes))
         return jsonify({
             "message": "Batch close operation completed.",
             "successful_closes": successful_closes,
@@ -520,5 +817,5 @@ def close_positions_batch_endpoint():
         })
 
     except Exception as e:
-        logger.error(f"An exception occurred in close_positions_batch_endpoint: {str(e)}", exc_info=True)
+        logger.error("An exception occurred in close_positions_batch_endpoint: %s", e, exc_info=True)
         return jsonify({"error": "Internal server error"}), 500
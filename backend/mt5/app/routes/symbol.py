@@ -1,6 +1,6 @@
 from flask import Blueprint, jsonify
 import MetaTrader5 as mt5
-from flasgger import swag_from
+from swagger import swag_from
 import logging
 
 symbol_bp = Blueprint('symbol', __name__)
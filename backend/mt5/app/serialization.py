@@ -0,0 +1,54 @@
+import orjson
+from flask import Response
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+
+# Datetimes are passed through to _default so they keep Flask's HTTP-date format,
+# and non-string keys are coerced as the stdlib encoder does.
+JSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj):
+    # MT5 results nest named tuples (the echoed trade request); emit them as
+    # lists, as the stdlib encoder does. Everything else orjson cannot encode
+    # (datetimes, pandas Timestamps, decimals) gets Flask's default handling.
+    if isinstance(obj, tuple):
+        return list(obj)
+    return DefaultJSONProvider.default(obj)
+
+
+def dumps(obj) -> bytes:
+    return orjson.dumps(obj, default=_default, option=JSON_OPTIONS)
+
+
+def json_response(obj, status=200):
+    """
+    Builds a JSON response encoded with orjson.
+    """
+    return Response(dumps(obj), status=status, mimetype='application/json')
+
+
+class OrjsonProvider(JSONProvider):
+    """
+    Flask JSON provider backed by orjson, used by jsonify and request.get_json.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes to the response directly; the base implementation
+        # goes through dumps() and re-encodes the decoded str.
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype='application/json')
+
+
+def parse_fields(value):
+    """
+    Parses a comma-separated `fields` query parameter into a list of names, or None when absent.
+    """
+    if not value:
+        return None
+    return [field for field in map(str.strip, value.split(',')) if field] or None
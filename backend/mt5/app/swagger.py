@@ -1,3 +1,15 @@
+import os
+
+# Interactive API docs. Production deployments set ENABLE_DOCS=0 so flasgger is
+# never imported and the route specs are not registered.
+DOCS_ENABLED = os.getenv('ENABLE_DOCS', '1') == '1'
+
+if DOCS_ENABLED:
+    from flasgger import swag_from
+else:
+    def swag_from(specs):
+        return lambda view: view
+
 swagger_config = {
     "swagger": "2.0",
     "info": {